@@ -1,7 +1,8 @@
 import streamlit as st
-from src.utils import set_page_config, inject_custom_css, render_sidebar_filters
-from src.db import get_connection, run_query, get_games_list, get_full_game_results, get_summary_stats
+from src.utils import set_page_config, inject_custom_css, render_sidebar_filters, natural_sort
+from src.db import get_connection, get_games_list, get_full_game_results, get_summary_stats
 import pandas as pd
+import numpy as np
 
 
 # Page Setup
@@ -53,11 +54,11 @@ if engine:
     if not games_df.empty:
         # Create a readable label for the dropdown
         games_df['label'] = games_df['game_date'].astype(str) + " - " + games_df['game_name'] + " (" + games_df['game_number'] + ")"
-        game_options = dict(zip(games_df['label'], games_df['id']))
+        game_labels = dict(zip(games_df['id'].tolist(), games_df['label']))
 
         st.subheader("📅 Game Results")
-        selected_game_label = st.selectbox("Select Game", options=games_df['label'], index=0)
-        selected_game_id = game_options[selected_game_label]
+        # Options are plain int ids (stable cache keys); labels are only used for display
+        selected_game_id = st.selectbox("Select Game", options=list(game_labels), format_func=game_labels.get, index=0)
 
         game_info = games_df[games_df['id'] == selected_game_id].iloc[0]
 
@@ -67,27 +68,19 @@ if engine:
         st.markdown("---")
 
         # --- Fetch Results ---
+        # Leaderboard arrives already pivoted and sorted: Rank | Team | Total | R1 | R2 | ...
         results_df = get_full_game_results(selected_game_id)
 
         if not results_df.empty:
-            # Pivot rounds: Team | Rank | Total | R1 | R2 | ...
-            pivot_df = results_df.pivot_table(
-                index=['rank', 'name', 'total_score'], 
-                columns='round_name', 
-                values='score'
-            ).reset_index()
-            
-            # Sort by Rank
-            pivot_df.sort_values('rank', inplace=True)
-            
-            # Rename columns for consistency
-            pivot_df = pivot_df.rename(columns={
+            pivot_df = results_df.rename(columns={
                 'rank': 'Rank',
                 'name': 'Team',
                 'total_score': 'Total Points'
             })
-            # Capitalize round names
+            # Capitalize round names and order them naturally (Round 2 before Round 10)
             pivot_df.columns = [str(c).title() if c not in ['Rank', 'Team', 'Total Points'] else c for c in pivot_df.columns]
+            round_cols = natural_sort(c for c in pivot_df.columns if c not in ['Rank', 'Team', 'Total Points'])
+            pivot_df = pivot_df[['Rank', 'Team', 'Total Points'] + round_cols]
             
             # --- Highlights ---
             winner_name = pivot_df.iloc[0]['Team']
@@ -104,11 +97,14 @@ if engine:
             st.subheader("Leaderboard")
             
             def highlight_top(s):
-                if s.name == 'Rank':
-                     return ['background-color: #ffd700' if v == 1 else 
-                             'background-color: #c0c0c0' if v == 2 else 
-                             'background-color: #cd7f32' if v == 3 else '' for v in s]
-                return ['' for _ in s]
+                # Gold / silver / bronze for the podium, computed in one vectorized pass
+                # (rank is nullable; a missing rank gets no colour)
+                rank = s.fillna(0)
+                return np.select(
+                    [rank == 1, rank == 2, rank == 3],
+                    ['background-color: #ffd700', 'background-color: #c0c0c0', 'background-color: #cd7f32'],
+                    default=''
+                )
 
             st.dataframe(
                 pivot_df.style.apply(highlight_top, subset=['Rank']).format(precision=1),
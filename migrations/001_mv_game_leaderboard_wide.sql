@@ -0,0 +1,25 @@
+-- Per-game leaderboard: one row per team, round scores packed into a JSONB object.
+-- Read by get_full_game_results in src/db.py.
+--
+-- Refresh after every data load (the collector's daily job):
+--   REFRESH MATERIALIZED VIEW CONCURRENTLY quizplease.mv_game_leaderboard_wide;
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS quizplease.mv_game_leaderboard_wide AS
+SELECT
+    tgp.game_id,
+    tgp.team_id,
+    t.name,
+    tgp.rank,
+    tgp.total_score,
+    COALESCE(
+        jsonb_object_agg(rs.round_name, rs.score) FILTER (WHERE rs.round_name IS NOT NULL),
+        '{}'::jsonb
+    ) AS rounds
+FROM quizplease.team_game_participations tgp
+JOIN quizplease.teams t ON t.id = tgp.team_id
+LEFT JOIN quizplease.round_scores rs ON rs.participation_id = tgp.id
+GROUP BY tgp.id, t.id;
+
+-- Required by REFRESH ... CONCURRENTLY, and serves the per-game lookups
+CREATE UNIQUE INDEX IF NOT EXISTS mv_game_leaderboard_wide_game_team_idx
+    ON quizplease.mv_game_leaderboard_wide (game_id, team_id);
@@ -0,0 +1,12 @@
+-- Covering indexes on the base tables read by src/db.py.
+
+-- Round scores per participation, ordered by round: serves the round_scores join
+-- in get_avg_round_scores_by_team (from mv_team_game_stats.participation_id)
+-- without touching the heap for round_name.
+CREATE INDEX IF NOT EXISTS round_scores_participation_round_idx
+    ON quizplease.round_scores (participation_id, round_name) INCLUDE (score);
+
+-- Participations per team, carrying the columns the team histories
+-- (get_team_game_history, get_team_histories) and get_overall_summary read.
+CREATE INDEX IF NOT EXISTS team_game_participations_team_game_idx
+    ON quizplease.team_game_participations (team_id, game_id) INCLUDE (total_score, rank);
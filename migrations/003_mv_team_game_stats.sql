@@ -0,0 +1,43 @@
+-- One row per participation with the game attributes the sidebar filters on.
+-- Read by the standings, top-N and round-average queries in src/db.py, so that
+-- filtered aggregations scan a single table instead of joining games each time.
+--
+-- Refresh after every data load, together with mv_game_leaderboard_wide:
+--   REFRESH MATERIALIZED VIEW CONCURRENTLY quizplease.mv_team_game_stats;
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS quizplease.mv_team_game_stats AS
+SELECT
+    tgp.id AS participation_id,
+    tgp.team_id,
+    tgp.game_id,
+    tgp.total_score,
+    tgp.rank,
+    g.game_date,
+    g.game_name,
+    g.category,
+    g.venue
+FROM quizplease.team_game_participations tgp
+JOIN quizplease.games g ON g.id = tgp.game_id;
+
+-- Required by REFRESH ... CONCURRENTLY
+CREATE UNIQUE INDEX IF NOT EXISTS mv_team_game_stats_participation_idx
+    ON quizplease.mv_team_game_stats (participation_id);
+-- Serves the MAX(game_id) cache tag
+CREATE INDEX IF NOT EXISTS mv_team_game_stats_game_idx
+    ON quizplease.mv_team_game_stats (game_id);
+
+-- Per-team aggregations read only these columns
+CREATE INDEX IF NOT EXISTS mv_team_game_stats_team_idx
+    ON quizplease.mv_team_game_stats (team_id) INCLUDE (total_score, rank, participation_id);
+
+-- Top-N finishes filter on rank first
+CREATE INDEX IF NOT EXISTS mv_team_game_stats_rank_idx
+    ON quizplease.mv_team_game_stats (rank) INCLUDE (team_id);
+
+-- Sidebar filters
+CREATE INDEX IF NOT EXISTS mv_team_game_stats_game_name_idx
+    ON quizplease.mv_team_game_stats (game_name);
+CREATE INDEX IF NOT EXISTS mv_team_game_stats_category_idx
+    ON quizplease.mv_team_game_stats (category);
+CREATE INDEX IF NOT EXISTS mv_team_game_stats_venue_idx
+    ON quizplease.mv_team_game_stats (venue);
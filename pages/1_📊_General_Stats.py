@@ -1,13 +1,14 @@
 import streamlit as st
-import plotly.express as px
 import pandas as pd
-from src.db import get_overall_top_teams, get_top_n_finishes, get_avg_round_scores_by_team, get_summary_stats
-from src.utils import render_sidebar_filters, set_page_config
+from src.db import get_overall_top_teams, get_overall_summary, get_top_n_finishes, get_avg_round_scores_by_team, get_summary_stats
+from src.utils import render_sidebar_filters, set_page_config, natural_sort
 
 set_page_config(page_title="General Stats", page_icon="assets/logo.svg")
 
 st.title("📊 General Statistics")
 
+MAX_TREEMAP_NODES = 200
+
 
 # Filters
 filters = render_sidebar_filters()
@@ -19,16 +20,21 @@ summary = get_summary_stats(
     venues=filters['venues']
 )
 
-top_teams_df = get_overall_top_teams(limit=None, game_names=filters['game_names'], categories=filters['categories'], venues=filters['venues']) # Get all for calculations
+# Team-level aggregates are reduced in SQL; the standings table below fetches only the rows it shows
+overall = get_overall_summary(
+    game_names=filters['game_names'], 
+    categories=filters['categories'], 
+    venues=filters['venues']
+)
 
-if not top_teams_df.empty and summary['total_games'] > 0:
+if overall['total_teams'] > 0 and summary['total_games'] > 0:
     col1, col2, col3 = st.columns(3)
     with col1:
         st.metric("Avg Teams / Game", round(summary['avg_teams'], 1))
     with col2:
         st.metric("Total Games", summary['total_games'])
     with col3:
-        st.metric("Avg Points / Game", round(top_teams_df['avg_points'].mean(), 1))
+        st.metric("Avg Points / Game", round(overall['avg_points'], 1))
 else:
     st.warning("No data available.")
 
@@ -39,10 +45,8 @@ st.subheader("🏆 Overall Team Standings")
 st.caption("Top teams by total points accumulated across all games.")
 
 limit = st.slider("Number of teams to show", 5, 100, 20)
-display_df = top_teams_df.head(limit).copy().reset_index(drop=True)
-# Clean up dataframe for display
-if 'id' in display_df.columns:
-    display_df = display_df.drop(columns=['id'])
+top_teams_df = get_overall_top_teams(limit=limit, game_names=filters['game_names'], categories=filters['categories'], venues=filters['venues'])
+display_df = top_teams_df.copy().reset_index(drop=True)
 
 # Create Rank column (1-based index)
 display_df.index = range(1, len(display_df) + 1)
@@ -56,9 +60,15 @@ display_df = display_df.rename(columns={
     'avg_points': 'Avg Points'
 })
 
+# Formatting is declared via column_config instead of building a Styler on every rerun
+display_df = display_df.astype({'Avg Points': 'float64', 'Total Points': 'float64'})
 st.dataframe(
-    display_df.style.format({"Avg Points": "{:.1f}", "Total Points": "{:.0f}"}),
-    use_container_width=True
+    display_df,
+    use_container_width=True,
+    column_config={
+        "Avg Points": st.column_config.NumberColumn(format="%.1f"),
+        "Total Points": st.column_config.NumberColumn(format="%.0f")
+    }
 )
 
 # --- Section 2: Top N Finishes Treemap ---
@@ -66,75 +76,82 @@ st.markdown("---")
 st.subheader("🥇 Top Finishes Analysis")
 st.caption("Which teams finish in the top positions most often?")
 
-col_tree_1, col_tree_2 = st.columns([1, 3])
-with col_tree_1:
-    top_n_filter = st.selectbox("Select Top N Rank", [1, 3, 5, 10], index=1)
-
-finishes_df = get_top_n_finishes(top_n=top_n_filter, game_names=filters['game_names'], categories=filters['categories'], venues=filters['venues'])
-
-if not finishes_df.empty:
-    fig_tree = px.treemap(
-        finishes_df, 
-        path=['name'], 
-        values='finish_count',
-        title=f"Teams with Most Top-{top_n_filter} Finishes",
-        color='finish_count',
-        color_continuous_scale='Viridis'
-    )
-    # Update traces to show label and value on the square
-    fig_tree.update_traces(
-        textinfo="label+value",
-        hovertemplate='<b>%{label}</b><br>Finishes: %{value}<extra></extra>'
-    )
-    st.plotly_chart(fig_tree, use_container_width=True)
-else:
-    st.info("No data for this selection.")
+@st.fragment
+def render_top_finishes(filters):
+    """
+    Renders the Top-N treemap. Runs as a fragment so changing Top N only re-renders this block.
+    """
+    col_tree_1, col_tree_2 = st.columns([1, 3])
+    with col_tree_1:
+        top_n_filter = st.selectbox("Select Top N Rank", [1, 3, 5, 10], index=1)
+
+    # Cap the number of tiles so broad filters don't produce an unreadable, slow treemap;
+    # the cap is applied in SQL so the other teams are never fetched
+    finishes_df = get_top_n_finishes(top_n=top_n_filter, limit=MAX_TREEMAP_NODES, game_names=filters['game_names'], categories=filters['categories'], venues=filters['venues'])
+
+    if not finishes_df.empty:
+        # Plotly is imported only when there is something to draw
+        import plotly.express as px
+        fig_tree = px.treemap(
+            finishes_df, 
+            path=['name'], 
+            values='finish_count',
+            title=f"Teams with Most Top-{top_n_filter} Finishes",
+            color='finish_count',
+            color_continuous_scale='Viridis'
+        )
+        # Update traces to show label and value on the square
+        fig_tree.update_traces(
+            textinfo="label+value",
+            hovertemplate='<b>%{label}</b><br>Finishes: %{value}<extra></extra>'
+        )
+        # Keep zoom/drill state between reruns instead of resetting the figure
+        fig_tree.update_layout(uirevision='treemap_top_n')
+        st.plotly_chart(fig_tree, use_container_width=True)
+    else:
+        st.info("No data for this selection.")
+
+render_top_finishes(filters)
 
 # --- Section 3: Average Points by Round ---
 st.markdown("---")
 st.subheader("🎯 Average Performance by Round")
 st.caption("How teams perform on average in specific rounds.")
 
-# Fetch data and filter for top teams to keep chart readable
-avg_scores_df = get_avg_round_scores_by_team(game_names=filters['game_names'], categories=filters['categories'], venues=filters['venues'])
+# Fetch data only for the teams in the standings above to keep the table readable
+avg_scores_df = get_avg_round_scores_by_team(limit=limit, game_names=filters['game_names'], categories=filters['categories'], venues=filters['venues'])
 
 if not avg_scores_df.empty:
-    # Filter for teams in our top_teams_df list (top limit by default) to reduce noise
-    top_team_names = top_teams_df.head(limit)['name'].tolist()
-    filtered_avg_scores = avg_scores_df[avg_scores_df['name'].isin(top_team_names)]
-    
     # Pivot logic: Rows=Team, Cols=Round, Values=Score
     # Sort rounds naturally if possible (Round 1, Round 2...)
     # Using 'round_name' which is a string may need sorting.
     
-    pivot_df = filtered_avg_scores.pivot(index='name', columns='round_name', values='avg_score')
+    # Pivot on team_id: different teams can share a name
+    pivot_df = avg_scores_df.pivot(index=['team_id', 'name'], columns='round_name', values='avg_score')
     
     # Capitalize round names
     pivot_df.columns = [str(c).title() for c in pivot_df.columns]
     
-    # Try to sort columns naturally
-    try:
-        sorted_cols = sorted(pivot_df.columns, key=lambda x: int(''.join(filter(str.isdigit, x))) if any(c.isdigit() for c in x) else 999)
-        pivot_df = pivot_df[sorted_cols]
-    except:
-        pass # Keep default sort if fails
+    # Sort columns naturally (Round 1, Round 2, ..., Round 10)
+    pivot_df = pivot_df[natural_sort(pivot_df.columns)]
     
     # Add Total Avg column
     # Calculate row sum of averages (Average Total Score)
-    pivot_df['Total Avg'] = pivot_df.sum(axis=1)
+    pivot_df['Total Avg'] = pivot_df.sum(axis=1, numeric_only=True)
     
     # Sort by Total Avg descending
     pivot_df = pivot_df.sort_values('Total Avg', ascending=False)
     
     # Add Rank as index and reset Team to column
-    pivot_df = pivot_df.reset_index()
+    pivot_df = pivot_df.reset_index().drop(columns='team_id')
     pivot_df = pivot_df.rename(columns={'name': 'Team'})
     pivot_df.index = range(1, len(pivot_df) + 1)
     pivot_df.index.name = 'Rank'
     
     # Display styling
     st.dataframe(
-        pivot_df.style.format("{:.1f}", subset=pivot_df.columns.drop('Team')),
-        use_container_width=True
+        pivot_df,
+        use_container_width=True,
+        column_config={col: st.column_config.NumberColumn(format="%.1f") for col in pivot_df.columns.drop('Team')}
     )
 
@@ -1,20 +1,25 @@
 import streamlit as st
-import plotly.express as px
-import plotly.graph_objects as go
 import pandas as pd
-from src.db import get_all_teams, get_team_game_history, get_game_round_comparisons, get_full_game_results
-from src.utils import render_sidebar_filters, set_page_config
+import numpy as np
+from src.db import fetch_concurrently, get_all_teams, get_team_game_history, get_team_histories, get_full_game_results
+from src.utils import render_sidebar_filters, set_page_config, natural_sort, get_session_filter_options
 
 set_page_config(page_title="Team Analysis", page_icon="assets/logo.svg")
 
 st.title("🏆 Team Analysis")
 
 
+# Sidebar options and the team list are independent: load them side by side on the
+# session's first run; afterwards the options come from session_state and only the team list is fetched
+if "filter_options" not in st.session_state:
+    _, teams_df = fetch_concurrently((get_session_filter_options,), (get_all_teams,))
+else:
+    teams_df = get_all_teams()
+
 # Filters
 filters = render_sidebar_filters()
 
 # --- Filter: Select Team ---
-teams_df = get_all_teams()
 if teams_df.empty:
     st.error("No teams found in database.")
     st.stop()
@@ -29,117 +34,104 @@ except ValueError:
 selected_team_name = st.selectbox("Select Team", team_names, index=default_index)
 selected_team_id = int(teams_df[teams_df['name'] == selected_team_name]['id'].iloc[0])
 
+# The comparison team is picked further down (Section 4). On reruns its widget value is
+# already in session_state, so both histories can be fetched with a single query here.
+other_team_names = [t for t in team_names if t != selected_team_name]
+compare_team_name = st.session_state.get("compare_team")
+if compare_team_name not in other_team_names:
+    # Set default to 'СОЦИАЛЬНЫЙ КОНСТРУКТ' if available
+    if "СОЦИАЛЬНЫЙ КОНСТРУКТ" in other_team_names:
+        compare_team_name = "СОЦИАЛЬНЫЙ КОНСТРУКТ"
+    else:
+        compare_team_name = other_team_names[0] if other_team_names else None
 
-# --- Section 1: Dynamics of Game Points ---
-st.subheader("📈 Performance Dynamics")
-dynamics_df = get_team_game_history(selected_team_id, game_names=filters['game_names'], categories=filters['categories'], venues=filters['venues'])
+history_team_ids = [selected_team_id]
+if compare_team_name is not None:
+    history_team_ids.append(int(teams_df[teams_df['name'] == compare_team_name]['id'].iloc[0]))
 
+histories_df = get_team_histories(tuple(history_team_ids), game_names=filters['game_names'], categories=filters['categories'], venues=filters['venues'])
+team_histories = dict(tuple(histories_df.groupby('team_id'))) if not histories_df.empty else {}
 
-if not dynamics_df.empty:
-    # Calculate median
-    median_score = dynamics_df['total_score'].median()
-    
-    fig_line = px.line(
-        dynamics_df.sort_values('game_date'), 
-        x='game_date', 
-        y='total_score',
-        title=f"Total Points History for {selected_team_name}",
-        markers=True,
-        hover_data=['game_name', 'rank'],
-        labels={'game_date': 'Game Date', 'total_score': 'Total Points'}
-    )
-    
-    # Add median line
-    fig_line.add_hline(
-        y=median_score, 
-        line_dash="dash", 
-        annotation_text=f"Median: {median_score}", 
-        annotation_position="bottom right"
-    )
-    
-    st.plotly_chart(fig_line, use_container_width=True)
-    
-    # --- Section 2: Game Comparison ---
-    st.markdown("---")
-    st.subheader("🆚 Game Round Comparison")
-    st.caption("Compare team performance vs Max and Winner scores in a specific game.")
+def history_for(team_id):
+    """Returns one team's slice of the batched history (empty frame if it has no games)."""
+    if team_id in team_histories:
+        return team_histories[team_id].drop(columns=['team_id'])
+    if team_id in history_team_ids:
+        return histories_df.iloc[0:0].drop(columns=['team_id'], errors='ignore')
+    # Widget value differs from the prefetched one (e.g. options just changed)
+    return get_team_game_history(team_id, game_names=filters['game_names'], categories=filters['categories'], venues=filters['venues'])
 
+
+@st.fragment
+def render_game_comparison(dynamics_df, selected_team_name):
+    """
+    Renders the per-round comparison for one game of the team's history.
+    Runs as a fragment so picking another game only re-runs this block.
+    """
     # Create mapping for selectbox: "Date - Game Name" -> game_id
     # dynamics_df now has 'game_id'
     try:
-        game_options = {
-            f"{row['game_date']} - {row['game_name']}": int(row['game_id'])
-            for index, row in dynamics_df.iterrows()
-        }
+        # Iterate the underlying arrays directly instead of boxing each row into a Series
+        dates = dynamics_df['game_date'].astype(str).to_numpy()
+        names = dynamics_df['game_name'].to_numpy()
+        ids = dynamics_df['game_id'].to_numpy(dtype=np.int64)
+        game_options = {f"{d} - {n}": int(i) for d, n, i in zip(dates, names, ids)}
     except Exception as e:
         st.error(f"Error processing game history: {e}")
-        st.stop()
+        return
     
     selected_game_label = st.selectbox("Select Game for Comparison", list(game_options.keys()))
     selected_game_id = game_options[selected_game_label]
     
     if selected_game_id:
-        # Get full results for the game
+        # Get full results for the game, one row per team and one column per round
         full_game_results = get_full_game_results(selected_game_id)
         
         if not full_game_results.empty:
+            # Sort rounds naturally (Round 1, Round 2...)
+            rounds = natural_sort(c for c in full_game_results.columns if c not in ['rank', 'name', 'total_score'])
+            round_scores = full_game_results[rounds]
+            team_names = full_game_results['name']
+            
             # 1. Selected Team Data
-            team_results = full_game_results[full_game_results['name'] == selected_team_name].set_index('round_name')
+            team_rows = round_scores[team_names == selected_team_name]
+            team_scores = team_rows.iloc[0] if not team_rows.empty else pd.Series(dtype='float64')
             
             # 2. Winner Data (Rank 1)
-            # Handle potential ties for 1st place
+            # The team that ranked #1 overall; take the first one if there is a tie
             winners = full_game_results[full_game_results['rank'] == 1]
-            # Just take the first winner found per round usually, but winner scores are per round.
-            # Wait, "Winner Score" usually means the score of the Game Winner in that round.
-            # Yes, the team that ranked #1 overall.
             if not winners.empty:
-                 winner_name = winners.iloc[0]['name'] # Take first if tie
+                 winner_name = winners.iloc[0]['name']
+                 winner_scores = round_scores.loc[winners.index[0]]
             else:
                  winner_name = "Unknown"
-                 
-            winner_results = winners.set_index('round_name')
-            # If multiple winners, we might have duplicates in round name index. duplicates drop?
-            winner_results = winner_results[~winner_results.index.duplicated(keep='first')]
+                 winner_scores = pd.Series(dtype='float64')
 
             # 3. Max Score per Round Data
-            # Group by round and find max score
-            round_max_scores = full_game_results.groupby('round_name')['score'].max()
-            
-            # Prepare data for plotting
-            rounds = full_game_results['round_name'].unique()
-            # Sort rounds if needed (Round 1, Round 2...)
-            try:
-                rounds = sorted(rounds, key=lambda x: int(''.join(filter(str.isdigit, x))) if any(c.isdigit() for c in x) else 999)
-            except:
-                pass
-            
-            plot_data = []
-            
-            for r in rounds:
-                # Team Stats
-                team_score = team_results.loc[r, 'score'] if r in team_results.index else 0
-                
-                # Winner Stats
-                winner_score = winner_results.loc[r, 'score'] if r in winner_results.index else 0
-                
-                # Max Stats
-                max_score = round_max_scores.get(r, 0)
-                # Find who got max score
-                max_scorers = full_game_results[(full_game_results['round_name'] == r) & (full_game_results['score'] == max_score)]['name'].unique()
-                max_scorer_text = ", ".join(max_scorers)
-                
-                plot_data.append({
-                    "Round": r,
-                    "Team Points": team_score,
-                    "Winner Points": winner_score,
-                    "Winner Name": winner_name,
-                    "Max Points": max_score,
-                    "Max Scorer": max_scorer_text
-                })
+            # Column-wise max, plus every team that reached it
+            round_max_scores = round_scores.max()
+            is_round_max = round_scores.eq(round_max_scores)
+            max_scorers = pd.Series(
+                {r: ', '.join(dict.fromkeys(team_names[is_round_max[r]])) for r in rounds},
+                dtype=object
+            )
             
-            plot_df = pd.DataFrame(plot_data)
+            # Align all per-round series on the round order in one pass
+            plot_df = pd.concat(
+                {
+                    "Team Points": team_scores,
+                    "Winner Points": winner_scores,
+                    "Max Points": round_max_scores,
+                    "Max Scorer": max_scorers
+                },
+                axis=1
+            ).reindex(rounds)
+            plot_df = plot_df.fillna({"Team Points": 0, "Winner Points": 0, "Max Points": 0, "Max Scorer": ""})
+            plot_df = plot_df.rename_axis("Round").reset_index()
             
             # Plot using Graph Objects for custom tooltips
+            # Plotly is imported only where a chart is drawn; empty-data paths skip the import cost
+            import plotly.graph_objects as go
             fig_bar = go.Figure()
             
             fig_bar.add_trace(go.Bar(
@@ -178,6 +170,43 @@ if not dynamics_df.empty:
         else:
              st.warning("Detailed round results not available for this game.")
 
+# --- Section 1: Dynamics of Game Points ---
+st.subheader("📈 Performance Dynamics")
+dynamics_df = history_for(selected_team_id)
+
+
+if not dynamics_df.empty:
+    # Calculate median
+    median_score = dynamics_df['total_score'].median()
+    
+    import plotly.express as px
+    fig_line = px.line(
+        dynamics_df.sort_values('game_date'), 
+        x='game_date', 
+        y='total_score',
+        title=f"Total Points History for {selected_team_name}",
+        markers=True,
+        hover_data=['game_name', 'rank'],
+        labels={'game_date': 'Game Date', 'total_score': 'Total Points'}
+    )
+    
+    # Add median line
+    fig_line.add_hline(
+        y=median_score, 
+        line_dash="dash", 
+        annotation_text=f"Median: {median_score}", 
+        annotation_position="bottom right"
+    )
+    
+    st.plotly_chart(fig_line, use_container_width=True)
+    
+    # --- Section 2: Game Comparison ---
+    st.markdown("---")
+    st.subheader("🆚 Game Round Comparison")
+    st.caption("Compare team performance vs Max and Winner scores in a specific game.")
+
+    render_game_comparison(dynamics_df, selected_team_name)
+
     # --- Section 3: History Table ---
     st.markdown("---")
     st.subheader("📜 Game History")
@@ -197,47 +226,40 @@ if not dynamics_df.empty:
     st.caption("Compare key metrics against another team.")
     
     # Second team selector (exclude currently selected team)
-    other_team_names = [t for t in team_names if t != selected_team_name]
     if other_team_names:
-        # Set default to 'СОЦИАЛЬНЫЙ КОНСТРУКТ' if available
-        try:
-            compare_default_index = other_team_names.index("СОЦИАЛЬНЫЙ КОНСТРУКТ")
-        except ValueError:
-            compare_default_index = 0
+        compare_default_index = other_team_names.index(compare_team_name)
         compare_team_name = st.selectbox("Compare with Team", other_team_names, index=compare_default_index, key="compare_team")
         compare_team_id = int(teams_df[teams_df['name'] == compare_team_name]['id'].iloc[0])
         
-        # Get comparison team's game history
-        compare_dynamics_df = get_team_game_history(compare_team_id, game_names=filters['game_names'], categories=filters['categories'], venues=filters['venues'])
+        # Get comparison team's game history (already fetched together with the selected team)
+        compare_dynamics_df = history_for(compare_team_id)
         
         if not compare_dynamics_df.empty:
-            # Calculate metrics for both teams
-            def calculate_team_metrics(df, team_name):
-                games_played = len(df)
-                total_points = df['total_score'].sum()
-                avg_points = df['total_score'].mean()
-                avg_rank = df['rank'].mean()
-                top3_count = len(df[df['rank'] <= 3])
-                top3_rate = (top3_count / games_played * 100) if games_played > 0 else 0
-                best_rank = df['rank'].min()
-                worst_rank = df['rank'].max()
-                return {
-                    'Team': team_name,
-                    'Games Played': games_played,
-                    'Total Points': total_points,
-                    'Avg Points': round(avg_points, 1),
-                    'Avg Rank': round(avg_rank, 1),
-                    'Top 3 Rate (%)': round(top3_rate, 1),
-                    'Best Rank': best_rank,
-                    'Worst Rank': worst_rank
-                }
+            # Calculate metrics for both teams in a single groupby
+            combined_df = pd.concat([
+                dynamics_df[['rank', 'total_score']].assign(team=selected_team_name),
+                compare_dynamics_df[['rank', 'total_score']].assign(team=compare_team_name)
+            ], ignore_index=True)
+            combined_df['total_score'] = combined_df['total_score'].astype(float)
+            # rank is nullable: a missing rank counts as not top 3
+            combined_df['top3'] = (combined_df['rank'] <= 3).fillna(False)
             
-            team1_metrics = calculate_team_metrics(dynamics_df, selected_team_name)
-            team2_metrics = calculate_team_metrics(compare_dynamics_df, compare_team_name)
+            metrics_df = combined_df.groupby('team', sort=False).agg(
+                games_played=('rank', 'size'),
+                total_points=('total_score', 'sum'),
+                avg_points=('total_score', 'mean'),
+                avg_rank=('rank', 'mean'),
+                top3_rate=('top3', 'mean'),
+                best_rank=('rank', 'min'),
+                worst_rank=('rank', 'max')
+            ).reset_index()
+            metrics_df['top3_rate'] *= 100
+            metrics_df = metrics_df.round({'avg_points': 1, 'avg_rank': 1, 'top3_rate': 1})
+            metrics_df.columns = ['Team', 'Games Played', 'Total Points', 'Avg Points', 'Avg Rank', 'Top 3 Rate (%)', 'Best Rank', 'Worst Rank']
             
             # Display metrics table
-            metrics_df = pd.DataFrame([team1_metrics, team2_metrics])
             st.dataframe(metrics_df, use_container_width=True, hide_index=True)
+            team1_metrics, team2_metrics = metrics_df.iloc[0], metrics_df.iloc[1]
             
             # Radar Chart (normalized metrics)
             # Normalize: Avg Points (higher better), Avg Rank (lower better - invert), Top 3 Rate (higher better)
@@ -260,6 +282,7 @@ if not dynamics_df.empty:
                 team2_metrics['Top 3 Rate (%)']
             ]
             
+            import plotly.graph_objects as go
             fig_radar = go.Figure()
             
             fig_radar.add_trace(go.Scatterpolar(
@@ -295,40 +318,26 @@ if not dynamics_df.empty:
             st.markdown("#### Head-to-Head Results")
             st.caption("Games where both teams competed.")
             
-            # Find common game_ids
-            team1_game_ids = set(dynamics_df['game_id'].tolist())
-            team2_game_ids = set(compare_dynamics_df['game_id'].tolist())
-            common_game_ids = team1_game_ids.intersection(team2_game_ids)
+            # Join both histories on game_id to get the common games in one pass
+            h2h_df = dynamics_df[['game_id', 'game_date', 'game_name', 'rank']].drop_duplicates('game_id').merge(
+                compare_dynamics_df[['game_id', 'rank']].drop_duplicates('game_id'),
+                on='game_id',
+                suffixes=('_t1', '_t2')
+            )
             
-            if common_game_ids:
+            if not h2h_df.empty:
                 # Build head-to-head table
-                h2h_data = []
-                team1_wins = 0
-                team2_wins = 0
-                
-                for gid in common_game_ids:
-                    t1_row = dynamics_df[dynamics_df['game_id'] == gid].iloc[0]
-                    t2_row = compare_dynamics_df[compare_dynamics_df['game_id'] == gid].iloc[0]
-                    
-                    t1_rank = t1_row['rank']
-                    t2_rank = t2_row['rank']
-                    
-                    if t1_rank < t2_rank:
-                        winner = selected_team_name
-                        team1_wins += 1
-                    else:
-                        winner = compare_team_name
-                        team2_wins += 1
-                    
-                    h2h_data.append({
-                        'Game Date': t1_row['game_date'],
-                        'Game Name': t1_row['game_name'],
-                        f'{selected_team_name} Rank': t1_rank,
-                        f'{compare_team_name} Rank': t2_rank,
-                        'Winner': winner
-                    })
+                team1_won = (h2h_df['rank_t1'] < h2h_df['rank_t2']).fillna(False)
+                team1_wins = int(team1_won.sum())
+                team2_wins = len(h2h_df) - team1_wins
                 
-                h2h_df = pd.DataFrame(h2h_data).sort_values('Game Date', ascending=False)
+                h2h_df = pd.DataFrame({
+                    'Game Date': h2h_df['game_date'],
+                    'Game Name': h2h_df['game_name'],
+                    f'{selected_team_name} Rank': h2h_df['rank_t1'],
+                    f'{compare_team_name} Rank': h2h_df['rank_t2'],
+                    'Winner': np.where(team1_won, selected_team_name, compare_team_name)
+                }).sort_values('Game Date', ascending=False)
                 
                 # Summary
                 col1, col2 = st.columns(2)
@@ -1,5 +1,16 @@
+import re
 import streamlit as st
 
+__all__ = [
+    "set_page_config",
+    "inject_custom_css",
+    "natural_sort",
+    "get_session_filter_options",
+    "render_sidebar_filters",
+]
+
+_DIGIT_RE = re.compile(r'(\d+)')
+
 def set_page_config(page_title="Quiz Please Dashboard", page_icon="assets/logo.svg", layout="wide"):
     st.set_page_config(
         page_title=page_title,
@@ -21,11 +32,39 @@ def inject_custom_css():
         }
         </style>
     """, unsafe_allow_html=True)
-from src.db import get_filter_options
+
+def natural_sort(values):
+    """
+    Sorts round names by their number (Round 2 before Round 10).
+    Names without digits go last.
+    """
+    def sort_key(value):
+        match = _DIGIT_RE.search(str(value))
+        return (int(match.group(1)) if match else float('inf'), str(value))
+    return sorted(values, key=sort_key)
+
+from src.db import get_filter_options, refresh_data
+
+def get_session_filter_options():
+    """
+    Returns the sidebar filter options, fetched once per session and reused from
+    session_state on every rerun. The "Refresh data" button drops them.
+    """
+    if "filter_options" not in st.session_state:
+        options = get_filter_options()
+        # Empty options are not kept: they may come from a failed query that should be retried
+        if not any(options):
+            return options
+        st.session_state["filter_options"] = options
+    return st.session_state["filter_options"]
+
+def _refresh_filter_options():
+    st.session_state.pop("filter_options", None)
+    refresh_data()
 
 def render_sidebar_filters():
     """
-    Renders sidebar filters for Game Name and Category.
+    Renders sidebar filters for Game Name, Category and Venue.
     Returns a dictionary with selected filters.
     """
     st.sidebar.markdown("---")
@@ -39,7 +78,7 @@ def render_sidebar_filters():
     if "persistent_venues" not in st.session_state:
         st.session_state["persistent_venues"] = []
 
-    available_games, available_categories, available_venues = get_filter_options()
+    available_games, available_categories, available_venues = get_session_filter_options()
     
     selected_games = st.sidebar.multiselect(
         "Game Name",
@@ -65,6 +104,8 @@ def render_sidebar_filters():
     )
     st.session_state["persistent_venues"] = selected_venues
     
+    st.sidebar.button("🔄 Refresh data", on_click=_refresh_filter_options, help="Reload filter options and pick up newly loaded games")
+    
     return {
         "game_names": selected_games,
         "categories": selected_categories,